@@ -0,0 +1,243 @@
+import os
+import tomllib
+import time
+import orjson
+import threading
+import random
+import highscores as hs
+import players as pl
+import datetime
+import logging
+import dhooks
+from dataclasses import dataclass
+from operator import itemgetter
+
+os.chdir(f"{os.path.dirname(__file__)}")
+
+with open("../config.toml", "rb") as config_file:
+    config = tomllib.load(config_file)
+
+syntax = config.get("PL_FORMAT", {}).get("syntax")
+
+# Bot name and the highscore type it watches (6: Military destroyed, 4: Military lost).
+BOT_TYPES = (("md", 6), ("ml", 4))
+
+
+@dataclass
+class BotConfig:
+    name: str
+    hs_type: int
+    server: int
+    community: str
+    webhook: str
+    log_dir: str
+    file_dir: str
+
+    @classmethod
+    def from_config(cls, name: str, hs_type: int):
+        """
+        Build a bot configuration from its '[<NAME>_BOT]' section of config.toml.
+
+        Returns:
+            BotConfig
+        """
+        section = config.get(f"{name.upper()}_BOT", {})
+        return cls(
+            name=name,
+            hs_type=hs_type,
+            server=section.get(f"{name}_server"),
+            community=section.get(f"{name}_community"),
+            webhook=section.get(f"{name}_webhook"),
+            log_dir=section.get(f"{name}_log_dir"),
+            file_dir=section.get(f"{name}_file_dir"),
+        )
+
+
+def main():
+    bots = [
+        BotConfig.from_config(name, hs_type)
+        for name, hs_type in BOT_TYPES
+        if f"{name.upper()}_BOT" in config
+    ]
+    init_logging(bots)
+
+    threads = [
+        threading.Thread(target=run_bot, args=(bot,), name=bot.name) for bot in bots
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def init_logging(bots):
+    # Each bot runs in a thread named after it and keeps its own log file.
+    formatter = logging.Formatter("%(asctime)s %(levelname)s %(message)s")
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    for bot in bots:
+        handler = logging.FileHandler(bot.log_dir, mode="a")
+        handler.setFormatter(formatter)
+        handler.addFilter(lambda record, name=bot.name: record.threadName == name)
+        root_logger.addHandler(handler)
+
+
+def run_bot(bot: BotConfig):
+    old_data = init_file(bot)
+    check_bot(bot, old_data)
+
+
+def check_bot(bot: BotConfig, old_data: dict):
+    logging.info(f"Starting up check_{bot.name}")
+
+    hook = dhooks.Webhook(bot.webhook)
+
+    old_ts = int(old_data.get("timestamp"))
+    old_mtime = os.stat(bot.file_dir).st_mtime_ns
+
+    while True:
+        # The API updates hourly: sleep until then, then poll every minute.
+        next_check = old_ts + 3600 + random.randint(0, 30)
+        time.sleep(max(60, next_check - time.time()))
+
+        # Only re-read the state file if something else rewrote it meanwhile.
+        mtime = os.stat(bot.file_dir).st_mtime_ns
+        if mtime != old_mtime:
+            logging.info(f"{bot.file_dir} changed on disk, reloading it")
+            old_data = load_file(bot.file_dir)
+            old_ts = int(old_data.get("timestamp"))
+            old_mtime = mtime
+            if time.time() < old_ts + 3600:
+                continue
+
+        retry_count = 0
+        max_retries = 6
+
+        new_data, payload = compare(bot, old_data, old_ts)
+
+        if payload is False:
+            continue
+
+        logging.info("Sending payload")
+
+        while retry_count < max_retries:
+            try:
+                hook.send(payload)
+                logging.info("Done\n")
+                update_file(new_data, bot.file_dir)
+                old_data = new_data
+                old_ts = int(new_data.get("timestamp"))
+                old_mtime = os.stat(bot.file_dir).st_mtime_ns
+                break
+            except Exception as exception:
+                logging.warning(f"Calling hook.send(): {exception}")
+                logging.warning(
+                    f"Payload not sent, waiting 10s and trying again ({retry_count}/{max_retries})"
+                )
+                retry_count += 1
+                time.sleep(10)
+
+        if retry_count == max_retries:
+            logging.warning("Maximum dhook retries reached. Re-computing differences\n")
+
+
+def compare(bot: BotConfig, old_data, old_ts):
+    api = hs.get_highscore_api(bot.server, bot.community, 1, bot.hs_type)
+    if api is None:
+        return False, False
+    new_ts = api.timestamp()
+
+    if old_ts == new_ts:
+        logging.info(
+            f"Timestamps match: {old_ts} == {new_ts}, API not updated, exiting\n"
+        )
+        return False, False
+    logging.info(
+        f"Timestamps differ: {old_ts} != {new_ts}, API updated, computing differences"
+    )
+
+    new_data = api.data_dict()
+
+    pl_api = pl.get_players_api(bot.server, bot.community)
+    name_by_id = pl_api.names_dict() if pl_api is not None else {}
+
+    rows = []
+
+    old_scores = old_data["scores"]
+    new_scores = new_data["scores"]
+    if len(old_scores) < len(new_scores):
+        small, big = old_scores, new_scores
+    else:
+        small, big = new_scores, old_scores
+    for key in small:
+        if key not in big:
+            continue
+        diff = new_scores[key] - old_scores[key]
+        if diff != 0:
+            rows.append((diff, name_by_id.get(key, key)))
+
+    rows.sort(key=itemgetter(0), reverse=True)
+    width = max((len(name) for _, name in rows), default=0)
+    payload = "\n".join(
+        f"{name:<{width}} + " + f"{diff:,}".replace(",", ".") for diff, name in rows
+    )
+
+    if len(payload) > 1800:
+        payload = truncate_payload(payload, 1800, "[TRUNCATED]")
+
+    update_datetime = datetime.datetime.fromtimestamp(new_ts)
+    payload = f"```{syntax}\n{update_datetime}\n\n{payload}\n```"
+
+    return new_data, payload
+
+
+def load_file(dir):
+    logging.info(f"Loading {dir}")
+    with open(dir, "rb") as file:
+        data = orjson.loads(file.read())
+    if "scores" not in data:
+        data = upgrade_data(data)
+    return data
+
+
+def upgrade_data(data):
+    # State files written before the per-field layout hold one dict per player ID.
+    ranks = {}
+    scores = {}
+    for key, value in data.items():
+        if key not in ("server", "timestamp"):
+            ranks[key] = value["rank"]
+            scores[key] = value["score"]
+    return {
+        "server": data.get("server"),
+        "timestamp": data.get("timestamp"),
+        "ranks": ranks,
+        "scores": scores,
+    }
+
+
+def update_file(data, dir):
+    logging.info(f"Updating {dir}")
+    with open(dir, "wb") as file:
+        file.write(orjson.dumps(data))
+    logging.info("Done\n")
+
+
+def init_file(bot: BotConfig):
+    logging.info(f"Bot initial start-up, initializing {bot.file_dir}")
+    api = hs.get_highscore_api(bot.server, bot.community, 1, bot.hs_type)
+    api.json_export(bot.file_dir)
+    logging.info("Initialization complete\n")
+    return api.data_dict()
+
+
+def truncate_payload(string, max_length, cutoff_string):
+    # Keep whole lines only, leaving room for the newline and the cutoff string.
+    cut = string.rfind("\n", 0, max_length - len(cutoff_string))
+    if cut < 0:
+        return cutoff_string
+    return f"{string[:cut]}\n{cutoff_string}"
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,40 @@
 import requests
-import xml.etree.ElementTree as et
+import urllib3
+from requests.adapters import HTTPAdapter
 import logging
 import time
 import re
-import json
+import orjson
+import functools
+import random
+
+try:
+    from lxml import etree as et
+
+    ITERPARSE_OPTIONS = {"huge_tree": False, "resolve_entities": False}
+except ImportError:
+    # Uses the _elementtree C accelerator on every Python recent enough for tomllib.
+    import xml.etree.ElementTree as et
+
+    ITERPARSE_OPTIONS = {}
+
+# Shared with players.py so polls to the same server reuse keep-alive connections.
+SESSION = requests.Session()
+SESSION.mount(
+    "https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0)
+)
+
+SERVER_ID_REGEX = re.compile(r"([a-zA-Z]+)([0-9]+)")
+
+# HTTP statuses for which reaching the API again will not help.
+CLIENT_ERRORS = (400, 401, 403, 404)
+
+# Raised while a streamed response body is read and parsed, e.g. the connection dropping midway.
+STREAM_ERRORS = (
+    requests.exceptions.RequestException,
+    urllib3.exceptions.HTTPError,
+    et.ParseError,
+)
 
 
 def key_error_to_none(err):
@@ -13,7 +44,44 @@ def key_error_to_none(err):
     return None
 
 
-class Hapi(et.Element):
+def retry_delay(attempt: int, attempt_sleep: int) -> float:
+    """
+    Compute the time to wait before reaching an API again, doubling with each failed attempt (capped at 60s) with a random jitter.
+
+    Returns:
+        float: Delay in seconds.
+    """
+    return min(60, attempt_sleep * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+
+
+def wait_before_retry(
+    message: str, attempt: int, max_attempts: int, attempt_sleep: int
+):
+    """
+    Log a failed attempt at reaching an API and wait retry_delay() before the next one, without waiting after the last attempt.
+
+    Returns:
+        NoneType: None
+    """
+    if attempt == max_attempts:
+        logging.warning(f"{message} ({attempt}/{max_attempts})")
+        return
+    delay = retry_delay(attempt, attempt_sleep)
+    logging.warning(
+        f"{message}. Trying again in {delay:.0f}s ({attempt}/{max_attempts})"
+    )
+    time.sleep(delay)
+
+
+class Hapi:
+    def __init__(self, root, data: dict):
+        self._root = root
+        self._data = data
+
+    @property
+    def attrib(self) -> dict:
+        return self._root.attrib
+
     def timestamp(self) -> int:
         """
         Retrieve the API last update Unix Epoch timestamp.
@@ -28,10 +96,9 @@ class Hapi(et.Element):
             NoneType: None
         """
         try:
-            timestamp = self.attrib["timestamp"]
+            return int(self.attrib["timestamp"])
         except KeyError as error:
-            key_error_to_none(error)
-        return int(timestamp)
+            return key_error_to_none(error)
 
     def server_id(self) -> int:
         """
@@ -47,10 +114,13 @@ class Hapi(et.Element):
             NoneType: None
         """
         try:
-            server_id = self.attrib["serverId"]
+            return str(self.attrib["serverId"])
         except KeyError as error:
-            key_error_to_none(error)
-        return str(server_id)
+            return key_error_to_none(error)
+
+    @functools.cached_property
+    def _server_id_match(self) -> re.Match:
+        return SERVER_ID_REGEX.match(self.server_id())
 
     def server_community(self) -> str:
         """
@@ -62,9 +132,7 @@ class Hapi(et.Element):
         Returns if failure:
             NoneType: None
         """
-        id = self.server_id()
-        community = re.search(r"([a-zA-Z]+)", id)[0]
-        return community
+        return self._server_id_match[1]
 
     def server_number(self) -> int:
         """
@@ -76,120 +144,80 @@ class Hapi(et.Element):
         Returns if failure:
             NoneType: None
         """
-        id = self.server_id()
-        number = re.search(r"([0-9]+)", id)[0]
-        return int(number)
+        return int(self._server_id_match[2])
+
+    @functools.cached_property
+    def _columns(self) -> tuple:
+        ids = list(self._data["scores"])
+        ranks = list(self._data["ranks"].values())
+        scores = list(self._data["scores"].values())
+        ships = list(self._data.get("ships", {}).values())
+        return ids, ranks, scores, ships
 
     def player_ids(self) -> list:
         """
         Retrieve the API player IDs.
 
-        Raises:
-            KeyError: If the attribute 'id' does not exist.
-
-        Returns if success:
+        Returns:
             list of str: e.g. ['123456', '456789', '789123']
-
-        Returns if failure:
-            NoneType: None
         """
-        ids = []
-        try:
-            for player in self.findall("player"):
-                ids.append(player.attrib["id"])
-        except KeyError as error:
-            key_error_to_none(error)
-        return ids
+        return self._columns[0]
 
     def player_scores(self) -> list:
         """
         Retrieve the API player scores.
 
-        Raises:
-            KeyError: If the attribute 'score' does not exist.
-
-        Returns if success:
+        Returns:
             list of int: e.g. [123456789, 456789, 789]
-
-        Returns if failure:
-            NoneType: None
         """
-        scores = []
-        try:
-            for player in self.findall("player"):
-                scores.append(int(player.attrib["score"]))
-        except KeyError as error:
-            key_error_to_none(error)
-        return scores
+        return self._columns[2]
 
     def player_ranks(self) -> list:
         """
         Retrieve the API player ranks.
 
-        Raises:
-            KeyError: If the attribute 'position' does not exist.
-
-        Returns if success:
+        Returns:
             list of int: e.g. [1, 12, 123]
-
-        Returns if failure:
-            NoneType: None
         """
-        ranks = []
-        try:
-            for player in self.findall("player"):
-                ranks.append(int(player.attrib["position"]))
-        except KeyError as error:
-            key_error_to_none(error)
-        return ranks
+        return self._columns[1]
 
-    def player_data(self):
+    def player_data(self) -> dict:
         """
         Retrieve the API players.
 
-        Raises:
-            KeyError: If the attribute 'player' does not exist.
-
-        Returns if success:
-            list of int: e.g. [123456, 456789, 789123]
-
-        Returns if failure:
-            NoneType: None
+        Returns:
+            dict: e.g. {'123456': {'rank': 1, 'score': 123456789}}
         """
-        players = {}
-        try:
-            for player in self.findall("player"):
-                players[player.attrib["id"]] = {
-                    "rank": int(player.attrib["position"]),
-                    "score": int(player.attrib["score"]),
-                }
-        except KeyError as error:
-            key_error_to_none(error)
-        return players
+        ids, ranks, scores, ships = self._columns
+        if not ships:
+            return {
+                id: {"rank": rank, "score": score}
+                for id, rank, score in zip(ids, ranks, scores)
+            }
+        return {
+            id: {"rank": rank, "score": score, "ships": ship_count}
+            for id, rank, score, ship_count in zip(ids, ranks, scores, ships)
+        }
 
     def data_dict(self) -> dict:
         """
-        Creates a dictionnary containing timestamp, players, player ranks and player scores.
+        Creates a dictionnary containing timestamp and player ranks, scores (and ships) keyed by player ID.
 
         Returns:
-            dict
+            dict: e.g. {'server': 'fr123', 'timestamp': 1700000000, 'ranks': {'123456': 1}, 'scores': {'123456': 123456789}}
         """
-        data = {}
-        data["server"] = self.server_id()
-        data["timestamp"] = self.timestamp()
-        data.update(self.player_data())
-        return data
+        return self._data
 
     def json_export(self, outfile_path: str):
         """
-        Export a JSON file containg the API timestamp, players, player ranks and player scores.
+        Export a JSON file containg the API timestamp, player ranks and player scores.
 
         Returns:
             NoneType: None
         """
         data = self.data_dict()
-        with open(f"{outfile_path}", "w+") as outfile:
-            json.dump(data, outfile)
+        with open(f"{outfile_path}", "wb") as outfile:
+            outfile.write(orjson.dumps(data))
 
 
 class MHapi(Hapi):
@@ -197,54 +225,55 @@ class MHapi(Hapi):
         """
         Retrieve the API player ship count.
 
-        Raises:
-            KeyError: If the attribute 'player' does not exist.
-
-        Returns if success:
+        Returns:
             list of int: e.g. [1, 123, 123456, 123456789]
-
-        Returns if failure:
-            NoneType: None
         """
-        ships = []
-        try:
-            for player in self.findall("player"):
-                if "ships" in player.attrib:
-                    ships.append(int(player.attrib["ships"]))
-                else:
-                    ships.append(int(0))
-        except KeyError as error:
-            key_error_to_none(error)
-        return ships
+        return self._columns[3]
 
-    def player_data(self):
-        """
-        Retrieve all player data from the API.
 
-        Raises:
-            KeyError: If the attribute 'player' does not exist.
+def parse_highscore(source, ships: bool = False) -> tuple:
+    """
+    Stream-parse the highscore XML document, building the data dictionnary in a single pass.
 
-        Returns if success:
-            list of int: e.g. [123456, 456789, 789123]
+    Each <player> element is cleared and detached from the root once read,
+    so the whole document is never held in memory.
 
-        Returns if failure:
-            NoneType: None
-        """
-        players = {}
-        try:
-            for player in self.findall("player"):
-                if "ships" in player.attrib:
-                    ships = int(player.attrib["ships"])
-                else:
-                    ships = int(0)
-                players[player.attrib["id"]] = {
-                    "rank": int(player.attrib["position"]),
-                    "score": int(player.attrib["score"]),
-                    "ships": ships,
-                }
-        except KeyError as error:
-            key_error_to_none(error)
-        return players
+    Args:
+        source: File-like object yielding the XML document.
+
+        ships (bool): Whether to read the 'ships' attribute (military highscore).
+
+    Raises:
+        KeyError: If a root or player attribute does not exist.
+
+    Returns:
+        tuple: The root element (attributes only) and the data dictionnary.
+    """
+    ranks = {}
+    scores = {}
+    ship_counts = {}
+    data = {}
+    context = et.iterparse(source, events=("start", "end"), **ITERPARSE_OPTIONS)
+    _, root = next(context)
+    remove = root.remove
+    data["server"] = str(root.attrib["serverId"])
+    data["timestamp"] = int(root.attrib["timestamp"])
+    data["ranks"] = ranks
+    data["scores"] = scores
+    if ships:
+        data["ships"] = ship_counts
+    for event, elem in context:
+        if event != "end" or elem.tag != "player":
+            continue
+        attrib = elem.attrib
+        player_id = attrib["id"]
+        ranks[player_id] = int(attrib["position"])
+        scores[player_id] = int(attrib["score"])
+        if ships:
+            ship_counts[player_id] = int(attrib.get("ships", 0))
+        elem.clear()
+        remove(elem)
+    return root, data
 
 
 def get_highscore_api(
@@ -283,13 +312,13 @@ def get_highscore_api(
 
         max_attempts (int): The number of time the function will try to reach the API.
 
-        attempt_sleep (int): The amount of time (in seconds) the function will wait before trying to reach the API again after a previous failure.
+        attempt_sleep (int): The base amount of time (in seconds) the function will wait before trying to reach the API again after a previous failure, doubled after each failure (up to 60s) with a random jitter.
 
     Raises:
         HTTPError: If there is an error during the request.
 
     Returns if success:
-        Hapi(et.Element): The whole XML document as a tree.
+        Hapi: The API root attributes and player data.
 
     Returns if failure:
         NoneType: None
@@ -297,32 +326,48 @@ def get_highscore_api(
 
     api_url = f"https://s{server}-{community}.ogame.gameforge.com/api/highscore.xml?category={hs_category}&type={hs_type}"
 
-    attempt = 1
-
-    while attempt < max_attempts:
+    for attempt in range(1, max_attempts + 1):
         try:
-            response = requests.get(api_url, allow_redirects=False, timeout=10)
+            response = SESSION.get(
+                api_url, allow_redirects=False, timeout=10, stream=True
+            )
         except requests.exceptions.RequestException as error:
-            logging.warning(
-                f"Calling get_highscore_api(): RequestException: {error}. Trying again in {attempt_sleep}s ({attempt}/{max_attempts}"
+            wait_before_retry(
+                f"Calling get_highscore_api(): RequestException: {error}",
+                attempt,
+                max_attempts,
+                attempt_sleep,
             )
-            time.sleep(attempt_sleep)
-            attempt += 1
             continue
-        if response.status_code == 200:
-            xml_tree = et.fromstring(response.content)
-            if hs_type == 3:
-                tree = MHapi(xml_tree.tag, xml_tree.attrib, **xml_tree.attrib)
-            else:
-                tree = Hapi(xml_tree.tag, xml_tree.attrib, **xml_tree.attrib)
-            tree.extend(list(xml_tree))
-            return tree
-        else:
-            logging.warning(
-                f"Calling get_highscore_api(): HTTP error: {response.status_code}. Trying again in {attempt_sleep}s ({attempt}/{max_attempts})"
+        with response:
+            if response.status_code == 200:
+                response.raw.decode_content = True
+                try:
+                    root, data = parse_highscore(response.raw, ships=hs_type == 3)
+                except KeyError as error:
+                    return key_error_to_none(error)
+                except STREAM_ERRORS as error:
+                    wait_before_retry(
+                        f"Calling get_highscore_api(): reading the response failed: {error}",
+                        attempt,
+                        max_attempts,
+                        attempt_sleep,
+                    )
+                    continue
+                if hs_type == 3:
+                    return MHapi(root, data)
+                return Hapi(root, data)
+        if response.status_code in CLIENT_ERRORS:
+            logging.error(
+                f"Calling get_highscore_api(): HTTP error: {response.status_code}. Not trying again."
             )
-            time.sleep(attempt_sleep)
-            attempt += 1
+            return None
+        wait_before_retry(
+            f"Calling get_highscore_api(): HTTP error: {response.status_code}",
+            attempt,
+            max_attempts,
+            attempt_sleep,
+        )
     logging.error(
         f"Reached maximum attempts limit ({max_attempts}). Unable to obtain XML tree."
     )
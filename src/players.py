@@ -1,9 +1,23 @@
 import requests
-import xml.etree.ElementTree as et
+from requests.adapters import HTTPAdapter
 import logging
-import time
-import re
-import json
+import sys
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from highscores import SESSION, CLIENT_ERRORS, STREAM_ERRORS, wait_before_retry
+
+try:
+    from lxml import etree as et
+
+    ITERPARSE_OPTIONS = {"huge_tree": True, "collect_ids": False}
+except ImportError:
+    # Uses the _elementtree C accelerator on every Python recent enough for tomllib.
+    import xml.etree.ElementTree as et
+
+    ITERPARSE_OPTIONS = {}
+
+# Last players API retrieved per (server, community), with its 'Last-Modified' header.
+PLAYERS_CACHE = {}
 
 
 def key_error_to_none(err):
@@ -13,7 +27,31 @@ def key_error_to_none(err):
     return None
 
 
-class Papi(et.Element):
+class Papi:
+    __slots__ = (
+        "_root",
+        "_ids",
+        "_names",
+        "_status",
+        "_alliance",
+        "_players",
+        "_id_to_name",
+        "_name_to_id",
+        "_timestamp",
+        "_server_id",
+        "_server_split",
+    )
+
+    def __init__(self, root, columns: tuple):
+        self._root = root
+        self._ids, self._names, self._status, self._alliance = columns
+        self._players = None
+        self._id_to_name = None
+        self._name_to_id = None
+        self._timestamp = None
+        self._server_id = None
+        self._server_split = None
+
     def timestamp(self) -> int:
         """
         Retrieve the API last update Unix Epoch timestamp.
@@ -27,11 +65,12 @@ class Papi(et.Element):
         Returns if failure:
             NoneType: None
         """
-        try:
-            timestamp = self.attrib["timestamp"]
-        except KeyError as error:
-            key_error_to_none(error)
-        return int(timestamp)
+        if self._timestamp is None:
+            try:
+                self._timestamp = int(self._root.attrib["timestamp"])
+            except KeyError as error:
+                return key_error_to_none(error)
+        return self._timestamp
 
     def server_id(self) -> int:
         """
@@ -46,11 +85,22 @@ class Papi(et.Element):
         Returns if failure:
             NoneType: None
         """
-        try:
-            server_id = self.attrib["serverId"]
-        except KeyError as error:
-            key_error_to_none(error)
-        return str(server_id)
+        if self._server_id is None:
+            try:
+                self._server_id = str(self._root.attrib["serverId"])
+            except KeyError as error:
+                return key_error_to_none(error)
+        return self._server_id
+
+    def _split_server(self) -> tuple:
+        # Server IDs are letters followed by digits, e.g. 'fr123' -> ('fr', 123).
+        if self._server_split is None:
+            server_id = self.server_id()
+            for index, char in enumerate(server_id):
+                if char.isdigit():
+                    self._server_split = (server_id[:index], int(server_id[index:]))
+                    break
+        return self._server_split
 
     def server_community(self) -> str:
         """
@@ -59,9 +109,7 @@ class Papi(et.Element):
         Returns if success:
             str: e.g. 'fr'
         """
-        id = self.server_id()
-        community = re.search(r"([a-zA-Z]+)", id)[0]
-        return community
+        return self._split_server()[0]
 
     def server_number(self) -> int:
         """
@@ -70,60 +118,31 @@ class Papi(et.Element):
         Returns if success:
             int: e.g. 123
         """
-        id = self.server_id()
-        number = re.search(r"([0-9]+)", id)[0]
-        return int(number)
+        return self._split_server()[1]
 
     def player_ids(self) -> list:
         """
         Retrieve the player IDs from the API.
 
-        Raises:
-            KeyError: If the attribute 'id' does not exist.
-
-        Returns if success:
+        Returns:
             list of str: e.g. ['123456', '456789', '789123']
-
-        Returns if failure:
-            NoneType: None
         """
-        ids = []
-        try:
-            for player in self.findall("player"):
-                ids.append(player.attrib["id"])
-        except KeyError as error:
-            key_error_to_none(error)
-        return ids
+        return self._ids
 
     def player_names(self) -> list:
         """
         Retrieve the player names from the API.
 
-        Raises:
-            KeyError: If the attributes 'player' or 'name' do not exist.
-
-        Returns if success:
+        Returns:
             list of str: e.g. ['abc', 'abcdef', 'abcdefghi']
-
-        Returns if failure:
-            NoneType: None
         """
-        names = []
-        try:
-            for player in self.findall("player"):
-                names.append(player.attrib["name"])
-        except KeyError as error:
-            key_error_to_none(error)
-        return names
+        return self._names
 
     def player_status(self) -> list:
         """
         Retrieve the players status from the API.
 
-        Raises:
-            KeyError: If the attribute 'player' or 'status' do not exist.
-
-        Returns if success:
+        Returns:
             list of str: e.g. ['vI', 'I', 'Act', 'Act', 'vi']
             a: player is an administrator
             Act: player is active
@@ -132,79 +151,59 @@ class Papi(et.Element):
             I: player is Inactive (I > 35d)
             o: player is an outlaw
             v: player is in vacation mode
-
-        Returns if failure:
-            NoneType: None
         """
-        names = []
-        try:
-            for player in self.findall("player"):
-                if "status" in player.attrib:
-                    names.append(player.attrib["status"])
-                else:
-                    names.append("Act")
-        except KeyError as error:
-            key_error_to_none(error)
-        return names
+        return self._status
 
     def player_alliance(self) -> list:
         """
         Retrieve the players alliance IDs from the API.
 
-        Raises:
-            KeyError: If the attribute 'player' does not exist.
-
-        Returns if success:
+        Returns:
             list of str: e.g. ['501459', '501369', 'None']
             'ID': player has an alliance
             'None': player has no alliance
+        """
+        return self._alliance
 
-        Returns if failure:
-            NoneType: None
+    def filter_by_status(self, status: str) -> list:
         """
-        alliances = []
-        try:
-            for player in self.findall("player"):
-                if "alliance" in player.attrib:
-                    alliances.append(player.attrib["alliance"])
-                else:
-                    alliances.append("None")
-        except KeyError as error:
-            key_error_to_none(error)
-        return alliances
+        Retrieve the IDs of the players having the given status, see player_status().
+
+        Returns:
+            list of str: e.g. ['123456', '456789']
+        """
+        return [
+            id
+            for id, player_status in zip(self._ids, self._status)
+            if player_status == status
+        ]
 
     def player_data(self) -> dict:
         """
         Retrieve all player data from the API.
 
-        Raises:
-            KeyError: If the attribute 'player' does not exist.
-
-        Returns if success:
-            dict
+        Returns:
+            dict: e.g. {'123456': {'name': 'abc', 'status': 'Act', 'alliance': 'None'}}
+        """
+        if self._players is None:
+            self._players = {
+                id: {"name": name, "status": status, "alliance": alliance}
+                for id, name, status, alliance in zip(
+                    self._ids, self._names, self._status, self._alliance
+                )
+            }
+        return self._players
+
+    def names_dict(self) -> dict:
+        """
+        Retrieve a mapping of player IDs to player names from the API.
 
-        Returns if failure:
-            NoneType: None
+        Returns:
+            dict: e.g. {'123456': 'abc', '456789': 'abcdef'}
         """
-        players = {}
-        try:
-            for player in self.findall("player"):
-                if "status" in player.attrib:
-                    status = player.attrib["status"]
-                else:
-                    status = "Act"
-                if "alliance" in player.attrib:
-                    alliance = player.attrib["alliance"]
-                else:
-                    alliance = "None"
-                players[player.attrib["id"]] = {
-                    "name": player.attrib["name"],
-                    "status": status,
-                    "alliance": alliance,
-                }
-        except KeyError as error:
-            key_error_to_none(error)
-        return players
+        if self._id_to_name is None:
+            self._id_to_name = dict(zip(self._ids, self._names))
+        return self._id_to_name
 
     def json_export(self, outfile_path: str):
         """
@@ -213,12 +212,24 @@ class Papi(et.Element):
         Returns:
             NoneType: None
         """
-        data = {}
-        data["server"] = self.server_id()
-        data["timestamp"] = self.timestamp()
-        data.update(self.player_data())
-        with open(f"{outfile_path}", "w+") as outfile:
-            json.dump(data, outfile)
+        # Written player by player from the columns, without building player_data().
+        header = orjson.dumps(
+            {"server": self.server_id(), "timestamp": self.timestamp()}
+        )
+        players = zip(self._ids, self._names, self._status, self._alliance)
+        with open(f"{outfile_path}", "wb") as outfile:
+            outfile.write(header[:-1])
+            outfile.writelines(
+                b",%b:%b"
+                % (
+                    orjson.dumps(id),
+                    orjson.dumps(
+                        {"name": name, "status": status, "alliance": alliance}
+                    ),
+                )
+                for id, name, status, alliance in players
+            )
+            outfile.write(b"}")
 
     def name_from_id(self, player_id: str) -> str:
         """
@@ -230,13 +241,7 @@ class Papi(et.Element):
         Returns if failure:
             NoneType
         """
-        data = self.player_data()
-        if data is None:
-            return None
-        try:
-            return str(data[player_id]["name"])
-        except KeyError:
-            return None
+        return self.names_dict().get(player_id)
 
     def id_from_name(self, player_name: str) -> str:
         """
@@ -248,15 +253,49 @@ class Papi(et.Element):
         Returns if failure:
             NoneType
         """
-        data = self.player_data()
-        if data is None:
-            return None
-        try:
-            for key in data.keys():
-                if data[key]["name"] == player_name:
-                    return str(key)
-        except KeyError:
-            return None
+        if self._name_to_id is None:
+            # Built backwards so the first player wins should two share a name.
+            self._name_to_id = dict(zip(reversed(self._names), reversed(self._ids)))
+        return self._name_to_id.get(player_name)
+
+
+def parse_players(source) -> tuple:
+    """
+    Stream-parse the players XML document into parallel lists of player IDs, names, status and alliances.
+
+    Each <player> element is cleared and detached from the root once read,
+    so the whole document is never held in memory.
+
+    Args:
+        source: File-like object yielding the XML document.
+
+    Raises:
+        KeyError: If the attributes 'id' or 'name' do not exist.
+
+    Returns:
+        tuple: The root element (attributes only) and the (ids, names, status, alliances) lists.
+    """
+    # Status and alliance have few distinct values, interning shares one string each.
+    intern = sys.intern
+    ids, names, statuses, alliances = [], [], [], []
+    add_id = ids.append
+    add_name = names.append
+    add_status = statuses.append
+    add_alliance = alliances.append
+    context = et.iterparse(source, events=("start", "end"), **ITERPARSE_OPTIONS)
+    _, root = next(context)
+    remove = root.remove
+    for event, elem in context:
+        if event != "end" or elem.tag != "player":
+            continue
+        attrib = elem.attrib
+        add_id(attrib["id"])
+        add_name(attrib["name"])
+        add_status(intern(attrib.get("status", "Act")))
+        add_alliance(intern(attrib.get("alliance", "None")))
+        elem.clear()
+        remove(elem)
+    return root, (ids, names, statuses, alliances)
 
 
 def get_players_api(
@@ -264,10 +303,14 @@ def get_players_api(
     community: str,
     max_attempts: int = 6,
     attempt_sleep: int = 10,
+    session: requests.Session = SESSION,
 ) -> Papi:
     """
     Retrieve the whole XML tree of the players API.
 
+    The request is conditional on the previous retrieval's 'Last-Modified' header,
+    an unchanged API (HTTP 304) returns the previously retrieved Papi.
+
     Args:
         server (int): Server ID.
 
@@ -275,13 +318,15 @@ def get_players_api(
 
         max_attempts (int): The number of time the function will try to reach the API.
 
-        attempt_sleep (int): The amount of time (in seconds) the function will wait before trying to reach the API again after a previous failure.
+        attempt_sleep (int): The base amount of time (in seconds) the function will wait before trying to reach the API again after a previous failure, doubled after each failure (up to 60s) with a random jitter.
+
+        session (requests.Session): The session the request goes through, the one shared with highscores.py by default.
 
     Raises:
         HTTPError: If there is an error during the request.
 
     Returns if success:
-        Papi(et.Element): The whole XML document as a tree.
+        Papi: The API root attributes and player data.
 
     Returns if failure:
         NoneType: None
@@ -289,30 +334,82 @@ def get_players_api(
 
     api_url = f"https://s{server}-{community}.ogame.gameforge.com/api/players.xml"
 
-    attempt = 1
+    key = (server, community)
+    cached = PLAYERS_CACHE.get(key)
+    headers = {"If-Modified-Since": cached[0]} if cached is not None else {}
 
-    while attempt < max_attempts:
+    for attempt in range(1, max_attempts + 1):
         try:
-            response = requests.get(api_url, allow_redirects=False, timeout=5)
+            response = session.get(
+                api_url, headers=headers, allow_redirects=False, timeout=5, stream=True
+            )
         except requests.exceptions.RequestException as error:
-            logging.warning(
-                f"Calling get_players_api(): RequestException: {error}. Trying again in {attempt_sleep}s ({attempt}/{max_attempts}"
+            wait_before_retry(
+                f"Calling get_players_api(): RequestException: {error}",
+                attempt,
+                max_attempts,
+                attempt_sleep,
             )
-            time.sleep(attempt_sleep)
-            attempt += 1
             continue
-        if response.status_code == 200:
-            xml_tree = et.fromstring(response.content)
-            tree = Papi(xml_tree.tag, xml_tree.attrib, **xml_tree.attrib)
-            tree.extend(list(xml_tree))
-            return tree
-        else:
-            logging.warning(
-                f"Calling get_players_api(): HTTP error: {response.status_code}. Trying again in {attempt_sleep}s ({attempt}/{max_attempts})"
+        with response:
+            if response.status_code == 200:
+                response.raw.decode_content = True
+                try:
+                    root, columns = parse_players(response.raw)
+                except KeyError as error:
+                    return key_error_to_none(error)
+                except STREAM_ERRORS as error:
+                    wait_before_retry(
+                        f"Calling get_players_api(): reading the response failed: {error}",
+                        attempt,
+                        max_attempts,
+                        attempt_sleep,
+                    )
+                    continue
+                tree = Papi(root, columns)
+                if "Last-Modified" in response.headers:
+                    PLAYERS_CACHE[key] = (response.headers["Last-Modified"], tree)
+                return tree
+            if response.status_code == 304 and cached is not None:
+                return cached[1]
+        if response.status_code in CLIENT_ERRORS:
+            logging.error(
+                f"Calling get_players_api(): HTTP error: {response.status_code}. Not trying again."
             )
-            time.sleep(attempt_sleep)
-            attempt += 1
+            return None
+        wait_before_retry(
+            f"Calling get_players_api(): HTTP error: {response.status_code}",
+            attempt,
+            max_attempts,
+            attempt_sleep,
+        )
     logging.error(
         f"Reached maximum attempts limit ({max_attempts}). Unable to obtain XML tree."
     )
     return None
+
+
+def get_players_apis(servers: list, max_workers: int = 16) -> list:
+    """
+    Retrieve the players API of several servers concurrently.
+
+    Args:
+        servers (list of tuple): (server, community) pairs, e.g. [(123, 'fr'), (456, 'en')].
+
+        max_workers (int): The maximum number of APIs fetched at the same time.
+
+    Returns:
+        list of Papi: One entry per server, in the same order, None for each server that could not be reached.
+    """
+    # One connection pool per server, so each worker keeps its connection alive.
+    adapter = HTTPAdapter(
+        pool_connections=max_workers, pool_maxsize=max_workers, max_retries=0
+    )
+    with requests.Session() as session:
+        session.mount("https://", adapter)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(
+                executor.map(
+                    lambda server: get_players_api(*server, session=session), servers
+                )
+            )